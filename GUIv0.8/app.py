@@ -2,157 +2,106 @@ import streamlit as st
 import numpy as np
 import time
 import pandas as pd
-from streamlit_echarts import st_echarts
 import os
-import re
+import json
 import sys
 # custom modules
-from utils.target_op import B2900_target_control
+# utils.target_op loads the Keysight driver, it is imported where the device is actually used
 from utils.currgen import WaveGen
+from utils.analysis import (current_in_range_mask, remove_outliers_amd, downsample_indices,
+                            thickness_correction, circle_lateral_correction, square_lateral_correction)
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
 
+RSHEET_FACTOR = np.pi / np.log(2) # four-point probe sheet resistance factor, R_sheet = pi/ln(2) * V/I
 
-# Define the function to check if the Current is within ±30% of the Source
-def is_current_in_range(row, col1 = 'Source', col2 = 'Current'):
-    """
-    Checks if the current value is within 70% to 130% of the source value for a given row.
-
-    Parameters:
-    - row (pandas.Series): A row from a DataFrame containing the values to be compared.
-    - col1 (str): The name of the column containing the source value. Default is 'Source'.
-    - col2 (str): The name of the column containing the current value. Default is 'Current'.
-
-    Returns:
-    - bool: True if the current value is within the range, False otherwise.
-    """
-    source = abs(row[col1])
-    current = abs(row[col2])
-    lower_bound = source * 0.7
-    upper_bound = source * 1.3
-    return lower_bound <= current <= upper_bound
-
-def remove_anomaly_iqr(measurements):
-    # Calculate Q1 (25th percentile) and Q3 (75th percentile)
-    # Q1 = np.percentile(measurements, 25)
-    # Q3 = np.percentile(measurements, 75)
-    Q1 = np.percentile(measurements, 40)
-    Q3 = np.percentile(measurements, 60)
-    # Calculate IQR
-    IQR = Q3 - Q1
-    
-    # Define the bounds for non-anomalous data
-    lower_bound = Q1 - 0.85 * IQR
-    upper_bound = Q3 + 0.85 * IQR
-    
-    # Filter out anomalies
-    filtered_measurements = [x for x in measurements if lower_bound <= x <= upper_bound]
-    
-    return filtered_measurements
 
-def remove_outliers_amd(data, threshold=1.6):
-    """
-    Remove outliers from the data using AMD (Absolute Median Deviation).
+# Title of the web app
+st.set_page_config(layout="wide")
+st.title('Automated Test System UI')
 
-    Parameters:
-    data (array-like): Input data.
-    threshold (float): Threshold for outlier detection, default is 1.6.
+################################################
+# Cached resources and data
+################################################
 
-    Returns:
-    array-like: Data with outliers removed.
-    """
-    data = np.array(data)
-    median = np.median(data)
-    deviations = np.abs(data - median)
-    amd = np.median(deviations)
-    mask = np.abs(data - median) <= threshold * amd
-    return data[mask]
-
-def thickness_correction(thickness, Probe_spacing):
+@st.cache_resource
+def get_wavegen(magnitude):
     """
-    Calculate thickness correction factor for a given thickness and probe spacing.
-    
-    Parameters:
-    - thickness (float): The thickness of the material.
-    - Probe_spacing (float): The distance between the probes.
-    
-    Returns:
-    - f_1 (float): The thickness correction factor.
+    Return a WaveGen for the given magnitude, shared across reruns.
     """
-    t = thickness
-    s = Probe_spacing
-    ln_2 = np.log(2)
-    sinh_t_over_s = np.sinh(t / s)
-    sinh_t_over_2s = np.sinh(t / (2 * s))
-    ln_ratio = np.log(sinh_t_over_s / sinh_t_over_2s)
-    f_1 = ln_2 / ln_ratio
-    return f_1
-
-def circle_lateral_correction(diameter, Probe_spacing):
+    return WaveGen(magnitude=magnitude)
+
+@st.cache_resource
+def get_device(resource_name):
     """
-    Calculate lateral correction factor for circular geometries.
-    
-    Parameters:
-    - diameter (float): The diameter of the circular object.
-    - Probe_spacing (float): The distance between the probes.
-    
-    Returns:
-    - f_2 (float): The lateral correction factor for a circle.
+    Return the B2900_target_control connected to resource_name, shared across reruns.
+    Call get_device.clear() after closing the device so the next connection starts fresh.
     """
-    d = diameter
-    s = Probe_spacing
-    ln_2 = np.log(2)
-    d_over_s_squared = (d / s) ** 2
-    numerator = d_over_s_squared + 3
-    denominator = d_over_s_squared - 3
-    ln_fraction = np.log(numerator / denominator)
-    f_2 = ln_2 / (ln_2 + ln_fraction)
-    return f_2
-
-#sub function for square_lateral_correction, a,d will bve standarised to a/s, d/s
-def compute_am(m, a, d, s):
+    from utils.target_op import B2900_target_control
+    return B2900_target_control(resource_name=resource_name)
+
+@st.cache_data(max_entries=8) # bounded, the server can run for days with new parameters and data
+def get_square_wave(magnitude, length, period, high_value, low_value, duty_cycle, init_time):
     """
-    Compute a term used in the series expansion for square lateral correction.
-    
-    Parameters:
-    - m (int): The term index in the series expansion.
-    - a (float): The side length of the square normalized by probe spacing.
-    - d (float): The distance normalized by probe spacing.
-    - s (float): The probe spacing.
-    
-    Returns:
-    - (float): The computed term of the series.
+    Return the square wave generated by WaveGen for these parameters, cached across reruns.
     """
-    term1 = np.exp(-2 * np.pi * (a - 2) * m / d)
-    term2 = 1 - np.exp(-6 * np.pi * m / d)
-    term3 = 1 - np.exp(-2 * np.pi * m / d)
-    term4 = 1 + np.exp(-2 * np.pi * m / d)
-    return (1 / m) * term1 * (term2 * term3) / term4
-
-def square_lateral_correction(d, a, s, num_terms=50):
+    return get_wavegen(magnitude).generate_square_wave(length      =   length,
+                                                       period      =   period,
+                                                       high_value  =   high_value,
+                                                       low_value   =   low_value,
+                                                       duty_cycle  =   duty_cycle,
+                                                       init_time   =   init_time)
+
+@st.cache_data(max_entries=8) # bounded, the server can run for days with new parameters and data
+def build_chart_options(df):
     """
-    Calculate lateral correction factor for square geometries.
-    
-    Parameters:
-    - d (float): The distance.
-    - a (float): The side length of the square.
-    - s (float): The probe spacing.
-    - num_terms (int, optional): The number of terms to use in the series expansion (default is 50).
-    
-    Returns:
-    - (float): The lateral correction factor for a square.
+    Build the echarts options for the manual-mode Voltage/Current plot of df.
+    Cached on the content of df, so reruns with the same data skip rebuilding the series.
+    Long traces are reduced to the per-bucket extremes of both series, the saved data keeps full resolution.
     """
-    a = a/s
-    d = d/s
-    sum_am = np.sum([compute_am(m, a, d, s) for m in range(1, num_terms+1)])
-    term1 = np.pi / d
-    term2 = np.log(1 - np.exp(-4 * np.pi / d))
-    term3 = -np.log(1 - np.exp(-2 * np.pi / d))
-    return np.log(2) / (term1 + term2 + term3 + sum_am)
-
-# Title of the web app
-st.set_page_config(layout="wide")
-st.title('Automated Test System UI')
+    idx = np.union1d(downsample_indices(df["Voltage"].to_numpy()), downsample_indices(df["Current"].to_numpy()))
+    cols = df[["Time", "Voltage", "Current"]].iloc[idx].to_dict('list')
+    # original credict: https://echarts.apache.org/examples/en/editor.html?c=line-simple
+    return {
+        "title": {"text": "Measured Data", "left": "center"},
+        "tooltip": {"trigger": "axis"},
+        "legend": {"data": ["Voltage", "Current"], "right": 10},
+        "grid": {"left": "3%", "right": "4%", "bottom": "3%", "containLabel": True},
+        # "toolbox": {"feature": {"saveAsImage": {"type:'png'": None}}},
+        "xAxis": {
+            "name": "Time",
+            "type": "category",
+            "boundaryGap": False,
+            "data": cols["Time"],
+        },
+        # "yAxis": {"type": "value"},
+        "yAxis": [
+            {
+            "name": 'Current (A)\n\nVoltage (V)',
+            "type": 'value'
+            },
+            # {
+            # "name": 'Voltage(V)',
+            # "nameLocation": 'start',
+            # "alignTicks": "true",
+            # "type": 'value',
+            # "inverse": "true"
+            # }
+        ],
+        "series": [
+            {
+                "name": "Voltage",
+                "type": "line",
+                "data": cols["Voltage"],
+            },
+            {
+                # "yAxisIndex": 1,
+                "name": "Current",
+                "type": "line",
+                "data": cols["Current"],
+            },
+        ],
+    }
 
 ################################################
 # Pop-up Dialogs
@@ -165,8 +114,7 @@ def Establish_connection():
     with st.status("Connecting to device...", expanded=True) as status:
         st.write("Searching for device...")
         if 'device' not in st.session_state:
-            st.session_state.device = B2900_target_control(resource_name=resource_name)
-        time.sleep(1)
+            st.session_state.device = get_device(resource_name)
         if st.session_state.device.error is None: # return from device is needed
             status.update(label="Connection complete!", state="complete", expanded=False)
             st.session_state.Connected = True
@@ -178,37 +126,41 @@ def Establish_connection():
             st.error(f"Connection failed! Please try again. ErrorMessage: {st.session_state.device.error[0]}{st.session_state.device.error[1]}")
             st.session_state.name_disabled = False
             del st.session_state.device
+            get_device.clear() # do not keep the failed connection cached
             # st.rerun()
 
 @st.experimental_dialog("Test Initiated")
 def Test_Initiation():
+    from utils.target_op import DeviceError
+    tp = st.session_state.test_param
     with st.status("Downloading data...", expanded=True) as status:
         st.write("Searching for data...")
-        st.session_state.Measured_result = st.session_state.device.Measure_List(selected_channel = st.session_state.Channel,
-                                                                                current_data = square_wave,
-                                                                                nplc = st.session_state.test_param["nplc"],
-                                                                                curr_range = st.session_state.test_param["curr_range"],
-                                                                                mea_volt_range = st.session_state.test_param["Mea_Range"],
-                                                                                mea_wait = st.session_state.test_param["wait_time"],
-                                                                                compliance_volt= st.session_state.test_param["compliance_volt"]
-                                                                                )
-        st.write("Found URL.")
-        time.sleep(1)
-        st.write("Downloading data...")
-        time.sleep(1)
+        try:
+            st.session_state.Measured_result = st.session_state.device.Measure_List(selected_channel = st.session_state.Channel,
+                                                                                    current_data = square_wave,
+                                                                                    nplc = tp["nplc"],
+                                                                                    curr_range = tp["curr_range"],
+                                                                                    mea_volt_range = tp["Mea_Range"],
+                                                                                    mea_wait = tp["wait_time"],
+                                                                                    compliance_volt= tp["compliance_volt"],
+                                                                                    progress_cb = st.write
+                                                                                    )
+            device_error = None
+        except DeviceError as e:
+            device_error = e
         ####################
         # add the test logic here
         ####################
-        if type(st.session_state.Measured_result) == str: # return from device is needed
+        if device_error is not None:
             st.write("Data downloaded.")
             status.update(label="Test failed!", state="error", expanded=False)
-            st.error(f"Connection failed! Please try again. ErrorMessage: {st.session_state.Measured_result}")
+            st.error(f"Connection failed! Please try again. ErrorMessage: {device_error}")
             st.session_state.Measured_df = None
             st.session_state.test_initiated = False
             st.session_state.safe = None
         else:
             status.update(label="Test complete!", state="complete", expanded=False)
-            st.session_state.Measured_df = pd.DataFrame(st.session_state.Measured_result[0], columns=["Voltage", "Current", "Resistance", "Time", "Status", "Source"])
+            st.session_state.Measured_df = pd.DataFrame(st.session_state.Measured_result[0], columns=measure_fields)
             st.session_state.test_initiated = False
             st.session_state.safe = None
             # st.rerun()
@@ -217,11 +169,11 @@ def Test_Initiation():
 def Cal_start():
     with st.status("Downloading data...", expanded=True) as status:
         st.write("Searching for data...")
-        Calibration_result, error = st.session_state.device.calibrate()
+        Calibration_result, error = st.session_state.device.calibrate(progress_cb=st.write)
         ####################
         # add the test logic here
         ####################
-        if Calibration_result == False: # return from device is needed
+        if not Calibration_result: # False on a failed calibration, None if the device raised
             status.update(label="Test failed!", state="error", expanded=False)
             st.error(f"Connection failed! Please try again. ErrorMessage: {error[0]}{error[1]}")
             calibrating = False
@@ -234,47 +186,59 @@ def Cal_start():
 
 @st.experimental_dialog("Auto Test Initiated")
 def Auto_Test_Initiation():
+    from utils.target_op import DeviceError
+    tp = st.session_state.test_param
     with st.status("Downloading data...", expanded=True) as status:
-        st.session_state.Measured_df = pd.DataFrame() # initialize session df to an empty dataframe
-        wave = WaveGen(magnitude = st.session_state.test_param["magnitude"])
-        num_of_curr = len(st.session_state.test_param["curr_value"])
-        for i, value in enumerate(st.session_state.test_param["curr_value"]):
-            square_wave = wave.generate_square_wave(length      =   st.session_state.test_param["period"] * st.session_state.test_param["repeats"],
-                                                    period      =   st.session_state.test_param["period"],
-                                                    high_value  =   value,
-                                                    low_value   =   -value,
-                                                    duty_cycle  =   st.session_state.test_param["duty_cycle"],
-                                                    init_time   =   st.session_state.test_param["initial_zero"])
+        num_of_curr = len(tp["curr_value"])
+        # only the amplitude changes between tests, so generate a unit wave once and scale it
+        unit_wave = get_square_wave(magnitude   =   tp["magnitude"],
+                                    length      =   tp["period"] * tp["repeats"],
+                                    period      =   tp["period"],
+                                    high_value  =   1.0,
+                                    low_value   =   -1.0,
+                                    duty_cycle  =   tp["duty_cycle"],
+                                    init_time   =   tp["initial_zero"])
+        # raw results of the whole sweep, indexed as [current, sample, field] with fields ordered as measure_fields
+        # kept in float64, the V/I calculation subtracts two close voltage means
+        raw = np.empty((num_of_curr, len(unit_wave), len(measure_fields)), dtype=np.float64)
+        for i, value in enumerate(tp["curr_value"]):
+            square_wave = unit_wave * value
             
-            st.session_state.Auto_Measured_result = st.session_state.device.Measure_List(selected_channel = st.session_state.Channel,
-                                                                                        current_data = square_wave,
-                                                                                        nplc = st.session_state.test_param["nplc"],
-                                                                                        curr_range = 5e-4,
-                                                                                        mea_volt_range = st.session_state.test_param["Mea_Range"],
-                                                                                        mea_wait = st.session_state.test_param["wait_time"],
-                                                                                        compliance_volt = st.session_state.test_param["Mea_Range"]
-                                                                                        )
-            ####################
-            # add the test logic here
-            ####################
-            if type(st.session_state.Auto_Measured_result) == str: # return from device is needed
+            try:
+                st.session_state.device.Measure_List(selected_channel = st.session_state.Channel,
+                                                    current_data = square_wave,
+                                                    nplc = tp["nplc"],
+                                                    curr_range = 5e-4,
+                                                    mea_volt_range = tp["Mea_Range"],
+                                                    mea_wait = tp["wait_time"],
+                                                    compliance_volt = tp["Mea_Range"],
+                                                    out = raw[i]
+                                                    )
+            except DeviceError as e:
                 st.write("Data downloaded.")
                 status.update(label="Test failed!", state="error", expanded=False)
-                st.error(f"Connection failed! Please try again. ErrorMessage: {st.session_state.device.Auto_Measured_result}")
+                st.error(f"Connection failed! Please try again. ErrorMessage: {e}")
                 st.session_state.Measured_df = None
                 st.session_state.test_initiated = False
-            else:
-                # status.update(label="Test complete!", state="complete", expanded=False)
-                temp_df = pd.DataFrame(st.session_state.Auto_Measured_result[0], columns=[f"Voltage@{value}μA",
-                                                                                          f"Current@{value}μA",
-                                                                                          f"Resistance@{value}μA",
-                                                                                          f"Time@{value}μA",
-                                                                                          f"Status@{value}μA",
-                                                                                          f"Source@{value}μA"])
-                temp_df[f'In_Range@{value}μA'] = temp_df.apply(is_current_in_range, axis=1, col1=f"Source@{value}μA", col2=f"Current@{value}μA")
-                st.session_state.Measured_df = pd.concat([st.session_state.Measured_df, temp_df], axis=1)
-                st.write(f"completed {i+1} out of {num_of_curr} tests")
-                st.session_state.test_initiated = False
+                break
+            ####################
+            # add the test logic here
+            ####################
+            # status.update(label="Test complete!", state="complete", expanded=False)
+            st.write(f"completed {i+1} out of {num_of_curr} tests")
+            st.session_state.test_initiated = False
+        else:
+            # range check over the whole sweep at once
+            in_range = current_in_range_mask(raw[:, :, measure_fields.index("Source")], raw[:, :, measure_fields.index("Current")])
+            st.session_state.Measured_raw = raw
+            st.session_state.Measured_in_range = in_range
+            # the wide dataframe is built once from raw, for display and export
+            columns = {}
+            for i, value in enumerate(tp["curr_value"]):
+                for j, field in enumerate(measure_fields):
+                    columns[f"{field}@{value}μA"] = raw[i, :, j]
+                columns[f"In_Range@{value}μA"] = in_range[i]
+            st.session_state.Measured_df = pd.DataFrame(columns, copy=False)
 
 ################################################
 # mapping dictionaries
@@ -284,6 +248,7 @@ probe_dict = {
     "1.6 mm spacing; co-liner": {"spacing": 1.6, "layout": "coliner"},
     }
 equipped_probe = {}
+measure_fields = ["Voltage", "Current", "Resistance", "Time", "Status", "Source"] # column order of Measure_List results
 dim_mapping = {
     "2-inch (50.8 mm)": 50.8,
     "3-inch (76.2 mm)": 76.2,
@@ -331,29 +296,28 @@ with Target_selection_group:
             st.rerun()
 
         ## 2.Normal case
-        elif len(st.session_state.device_param) == 3:
+        elif st.session_state.device_param[0] is not None:
             # device info
             st.write("Targeted Device Model: ", st.session_state.device_param[1])
             st.write("Number of Channels Avaliable: ", len(st.session_state.device_param[0]))
             # Fetched device error display
-            if st.session_state.device_param[2][0] > 0:
+            if st.session_state.device_param[2][0] != 0: # SCPI error codes are mostly negative
                 st.write(":red[Device Error: ]", st.session_state.device_param[2][1], "Try to reconnect or restart the device.")
             #######Channel Selection (displaced outside the container)##############
             Chan_list = st.session_state.device_param[0]
             # Chan_list = ['channel1','channel2'] # test line
             # extract channel number
             Chan_selection = st.sidebar.selectbox("Select Channel", Chan_list)
-            match = re.search(r'\d+$', Chan_selection)
-            if match:
-                # Channel = int(match.group())
-                st.session_state.Channel = match.group()
+            chan_digits = Chan_selection[len(Chan_selection.rstrip("0123456789")):] # trailing digits of the channel name
+            if chan_digits:
+                st.session_state.Channel = chan_digits
             else:
                 st.session_state.Channel = None
             ########################################################################
 
         ## 3.Function error case
         else: 
-            e = st.session_state.device_param
+            e = st.session_state.device_param[2]
             st.exception(f"Error: {e[0]} {e[1]}")
 
         st.success(f"You have been connected with {resource_name}")
@@ -361,6 +325,7 @@ with Target_selection_group:
             if 'device' in st.session_state:
                 st.session_state.device.close()
                 del st.session_state.device
+                get_device.clear()
             del st.session_state.Connected
             del st.session_state.device_param
             del st.session_state.name_disabled
@@ -583,31 +548,43 @@ if st.button("Start Test",
              type="primary",
              use_container_width=True,
              disabled=not st.session_state.Connected):
-    # clear the previous test data
-    if 'Measured_df' in st.session_state:
-        del st.session_state.Measured_df
-    # session state take the value of param_dict
-    st.session_state.test_param = param_dict
-    st.session_state.test_initiated = True
+    # sample windows of the first period: forward half [init0, reverse_p), reverse half [reverse_p, end_p)
+    # computed once per test and reused by the manual and auto analysis
+    init0 = param_dict["initial_zero"]
+    param_dict["_windows"] = (init0, init0 + int(param_dict["period"]*param_dict["duty_cycle"]), init0 + param_dict["period"])
+    # both halves must be non-empty and the whole first period must lie inside the generated wave,
+    # an empty or cut half would average to NaN or a biased value and end up in the sheet resistance
+    if not (init0 < param_dict["_windows"][1] < param_dict["_windows"][2]
+            and param_dict["_windows"][2] <= param_dict["period"] * param_dict["repeats"]):
+        st.warning("Duty cycle and period leave no forward or reverse samples in a period, or the initial zeros push the first period past the end of the wave (initial zeros + period must not exceed period × number of periods). Please adjust them and try again.")
+    else:
+        # clear the previous test data
+        if 'Measured_df' in st.session_state:
+            del st.session_state.Measured_df
+        # session state take the value of param_dict
+        st.session_state.test_param = param_dict
+        st.session_state.test_initiated = True
     
+tp = st.session_state.test_param # local alias, test_param is not reassigned below
 if st.session_state.test_initiated and st.session_state.safe == None:
     #### wavegen block ####
-    wave = WaveGen(magnitude = st.session_state.test_param["magnitude"])
+    wave = get_wavegen(tp["magnitude"])
     # safety check
-    checksafety = wave._check_safety(st.session_state.test_param["curr_value"])
+    checksafety = wave._check_safety(tp["curr_value"])
     if not checksafety:
-        st.warning(f"Danger! High current input (value: {wave.magnitude*st.session_state.test_param['curr_value']} A). Human confirmation required.")
+        st.warning(f"Danger! High current input (value: {wave.magnitude*tp['curr_value']} A). Human confirmation required.")
         # wait for safety override input
         safety_override = st.text_input("Enter 'Y' to continue, 'N' to abort: ", None)
         if safety_override !=None:
             if safety_override.lower() == 'y':
                 st.session_state.safe = True
-                square_wave = wave.generate_square_wave(length      =   st.session_state.test_param["period"] * st.session_state.test_param["repeats"],
-                                                        period      =   st.session_state.test_param["period"],
-                                                        high_value  =   st.session_state.test_param["curr_value"],
-                                                        low_value   =   -st.session_state.test_param["curr_value"],
-                                                        duty_cycle  =   st.session_state.test_param["duty_cycle"],
-                                                        init_time   =   st.session_state.test_param["initial_zero"])
+                square_wave = get_square_wave(magnitude   =   tp["magnitude"],
+                                              length      =   tp["period"] * tp["repeats"],
+                                              period      =   tp["period"],
+                                              high_value  =   tp["curr_value"],
+                                              low_value   =   -tp["curr_value"],
+                                              duty_cycle  =   tp["duty_cycle"],
+                                              init_time   =   tp["initial_zero"])
             else:
                 st.session_state.safe = False
                 st.session_state.test_initiated = False
@@ -617,12 +594,13 @@ if st.session_state.test_initiated and st.session_state.safe == None:
             
     else:
         st.session_state.safe = True
-        square_wave = wave.generate_square_wave(length      =   st.session_state.test_param["period"] * st.session_state.test_param["repeats"],
-                                                period      =   st.session_state.test_param["period"],
-                                                high_value  =   st.session_state.test_param["curr_value"],
-                                                low_value   =   -st.session_state.test_param["curr_value"],
-                                                duty_cycle  =   st.session_state.test_param["duty_cycle"],
-                                                init_time   =   st.session_state.test_param["initial_zero"])
+        square_wave = get_square_wave(magnitude   =   tp["magnitude"],
+                                      length      =   tp["period"] * tp["repeats"],
+                                      period      =   tp["period"],
+                                      high_value  =   tp["curr_value"],
+                                      low_value   =   -tp["curr_value"],
+                                      duty_cycle  =   tp["duty_cycle"],
+                                      init_time   =   tp["initial_zero"])
     # st.write(square_wave)# test line
 
 #### (popup window) wait for the test to finish ####
@@ -635,40 +613,42 @@ if st.session_state.test_initiated:
             if st.session_state.Measured_df is not None:
                 # st.write("Test Completed")
                 st.write(st.session_state.Measured_df)
-                # Apply the function to each row and create a new column 'In_Range'
-                df = st.session_state.Measured_df # create dummy df to avoid changing the original session df
-                df['In_Range'] = df.apply(is_current_in_range, axis=1)
+                df = st.session_state.Measured_df # reference to the session df, it is only read below
+                # Check the whole column at once, the mask is only needed for the validity check
+                in_range = current_in_range_mask(df['Source'].to_numpy(), df['Current'].to_numpy())
 
                 # Check if 20% of the rows have Current values out of the ±20% range of Source
-                out_of_range_count = (df['In_Range'] == False).sum()
+                out_of_range_count = np.count_nonzero(~in_range)
                 total_rows = len(df)
                 if out_of_range_count / total_rows >= 0.2:
                     st.session_state.test_invalid = True
                 else:
                     st.session_state.test_invalid = None
         
-                reverse_p = st.session_state.test_param["initial_zero"]+int(st.session_state.test_param["period"]*st.session_state.test_param["duty_cycle"])
-                st.session_state.test_param['Volt_corrected'] = (df['Voltage'][st.session_state.test_param["initial_zero"]:reverse_p].mean()
-                                                                -
-                                                                df['Voltage'][reverse_p:st.session_state.test_param["initial_zero"]+st.session_state.test_param["period"]].mean())/2
-                st.session_state.test_param['Avg_curr'] = abs(df['Current']).mean()
-                st.session_state.test_param['Cal_V/I'] = st.session_state.test_param['Volt_corrected'] / st.session_state.test_param['Avg_curr']
+                V = df['Voltage'].to_numpy()
+                C = df['Current'].to_numpy()
+                init0, reverse_p, end_p = tp['_windows']
+                tp['Volt_corrected'] = (V[init0:reverse_p].mean()
+                                        -
+                                        V[reverse_p:end_p].mean())/2
+                tp['Avg_curr'] = np.abs(C).mean()
+                tp['Cal_V/I'] = tp['Volt_corrected'] / tp['Avg_curr']
                                 # thickness and lateral correction
                 if curr_adv != True:
-                    if st.session_state.test_param["est_thickness"] != None:
-                        st.session_state.test_param['thicknessComp'] = thickness_correction(st.session_state.test_param["est_thickness"]*1e-3, st.session_state.test_param["probe_spacing"])
+                    if tp["est_thickness"] != None:
+                        tp['thicknessComp'] = thickness_correction(tp["est_thickness"]*1e-3, tp["probe_spacing"])
                     else:
-                        st.session_state.test_param['thicknessComp'] = 1
+                        tp['thicknessComp'] = 1
                     if sample_shape == "Square":
-                        st.session_state.test_param['lateralComp'] = square_lateral_correction(st.session_state.test_param["square_d"],
-                                                                                            st.session_state.test_param["square_a"],
-                                                                                            st.session_state.test_param["probe_spacing"])
+                        tp['lateralComp'] = square_lateral_correction(tp["square_d"],
+                                                                      tp["square_a"],
+                                                                      tp["probe_spacing"])
                     elif sample_shape == "Circular":
-                        st.session_state.test_param['lateralComp'] = circle_lateral_correction(st.session_state.test_param["circular_diameter"],
-                                                                                            st.session_state.test_param["probe_spacing"])
+                        tp['lateralComp'] = circle_lateral_correction(tp["circular_diameter"],
+                                                                      tp["probe_spacing"])
 
                     
-                    st.session_state.test_param['Corr_Rsheet'] = st.session_state.test_param['Cal_V/I'] * np.pi/np.log(2) * st.session_state.test_param['thicknessComp'] * st.session_state.test_param['lateralComp']
+                    tp['Corr_Rsheet'] = tp['Cal_V/I'] * RSHEET_FACTOR * tp['thicknessComp'] * tp['lateralComp']
 
                     st.session_state.auto_result = False # toggle to avoid plot display warning
 
@@ -679,42 +659,40 @@ if st.session_state.test_initiated:
             # Call Auto test logic
             Auto_Test_Initiation()
             if st.session_state.Measured_df is not None:
-                out_of_range_count = 0
-                CorrectedVlist = []
-                Avgcurrlist = []
-                df = st.session_state.Measured_df
-                for i in st.session_state.test_param["curr_value"]:
-                    out_of_range_count += (df[f'In_Range@{i}μA'] == False).sum() # calculate the total number of out of range current values
-                    reverse_p = st.session_state.test_param["initial_zero"]+int(st.session_state.test_param["period"]*st.session_state.test_param["duty_cycle"])
-                    CorrectedVlist.append((df[f'Voltage@{i}μA'][st.session_state.test_param["initial_zero"]:reverse_p].mean()
-                                           -
-                                           df[f'Voltage@{i}μA'][reverse_p:st.session_state.test_param["initial_zero"]+st.session_state.test_param["period"]].mean())/2)
-                    Avgcurrlist.append(abs(df[f'Current@{i}μA']).mean())
+                init0, reverse_p, end_p = tp['_windows']
+                out_of_range_count = np.count_nonzero(~st.session_state.Measured_in_range) # total number of out of range current values
+                # (current, sample) arrays of the whole sweep, one row per forced current
+                V = st.session_state.Measured_raw[:, :, measure_fields.index("Voltage")]
+                C = st.session_state.Measured_raw[:, :, measure_fields.index("Current")]
+                CorrectedVlist = (V[:, init0:reverse_p].mean(axis=1)
+                                  -
+                                  V[:, reverse_p:end_p].mean(axis=1))/2
+                Avgcurrlist = np.abs(C).mean(axis=1)
                 # calculate V/I
-                st.session_state.test_param['Cal_V/I'] = [CorrectedVlist[i] / Avgcurrlist[i] for i in range(len(CorrectedVlist))]
+                tp['Cal_V/I'] = CorrectedVlist / Avgcurrlist
                 # filter out the anomalies
-                # st.session_state.test_param['Cal_V/I_filtered'] = remove_anomaly_iqr(st.session_state.test_param['Cal_V/I'])
-                st.session_state.test_param['Cal_V/I_filtered'] = remove_outliers_amd(st.session_state.test_param['Cal_V/I'])
-                st.session_state.test_param['Avg_V/I_filtered'] = np.mean(st.session_state.test_param['Cal_V/I_filtered'])
+                # tp['Cal_V/I_filtered'] = remove_anomaly_iqr(tp['Cal_V/I'])
+                tp['Cal_V/I_filtered'] = remove_outliers_amd(tp['Cal_V/I'])
+                tp['Avg_V/I_filtered'] = np.mean(tp['Cal_V/I_filtered'])
 
                 # thickness and lateral correction
-                if st.session_state.test_param["est_thickness"] != None:
-                    st.session_state.test_param['thicknessComp'] = thickness_correction(st.session_state.test_param["est_thickness"]*1e-3, st.session_state.test_param["probe_spacing"])
+                if tp["est_thickness"] != None:
+                    tp['thicknessComp'] = thickness_correction(tp["est_thickness"]*1e-3, tp["probe_spacing"])
                 else:
-                    st.session_state.test_param['thicknessComp'] = 1
+                    tp['thicknessComp'] = 1
                 if sample_shape == "Square":
-                    st.session_state.test_param['lateralComp'] = square_lateral_correction(st.session_state.test_param["square_d"],
-                                                                                           st.session_state.test_param["square_a"],
-                                                                                           st.session_state.test_param["probe_spacing"])
+                    tp['lateralComp'] = square_lateral_correction(tp["square_d"],
+                                                                  tp["square_a"],
+                                                                  tp["probe_spacing"])
                 elif sample_shape == "Circular":
-                    st.session_state.test_param['lateralComp'] = circle_lateral_correction(st.session_state.test_param["circular_diameter"],
-                                                                                           st.session_state.test_param["probe_spacing"])
+                    tp['lateralComp'] = circle_lateral_correction(tp["circular_diameter"],
+                                                                  tp["probe_spacing"])
                 
-                st.session_state.test_param['Corr_Rsheet'] = st.session_state.test_param['Avg_V/I_filtered'] * np.pi/np.log(2) * st.session_state.test_param['thicknessComp'] * st.session_state.test_param['lateralComp']
-                # st.session_state.test_param['Corr_Rsheet'] = st.session_state.test_param['Avg_V/I_filtered'] * st.session_state.test_param['thicknessComp'] * st.session_state.test_param['lateralComp']
+                tp['Corr_Rsheet'] = tp['Avg_V/I_filtered'] * RSHEET_FACTOR * tp['thicknessComp'] * tp['lateralComp']
+                # tp['Corr_Rsheet'] = tp['Avg_V/I_filtered'] * tp['thicknessComp'] * tp['lateralComp']
                 st.session_state.auto_result = True # toggle to avoid plot display warning
 
-                total_rows = len(df)*len(st.session_state.test_param["curr_value"])
+                total_rows = st.session_state.Measured_in_range.size
                 if out_of_range_count / total_rows >= 0.2:
                     st.session_state.test_invalid = True
                 else:
@@ -735,44 +713,44 @@ if 'Measured_df' in st.session_state:
 
 
 
-if 'Cal_V/I' in st.session_state.test_param:
+if 'Cal_V/I' in tp:
     result_container = st.container(border=True)    
     with result_container:
         st.header("Testing Results :", divider="grey")
     col1, col2, col3 = result_container.columns([1.5,1,2])
     with col1:
-        st.metric("$\Large {Corrected\space Sheet\space Resistance}$", f"{st.session_state.test_param['Corr_Rsheet'].round(5)} Ω/sq")
+        st.metric("$\Large {Corrected\space Sheet\space Resistance}$", f"{tp['Corr_Rsheet'].round(5)} Ω/sq")
         if st.session_state.auto_result == True:
             if surf == "Unknown":
-                if st.session_state.test_param['Corr_Rsheet'] < 5:
+                if tp['Corr_Rsheet'] < 5:
                     # st.subheader("The sample surface is likely to be metal.")
                     st.markdown('<p>The sample surface is likely to be <span style="font-size: larger; color: red; font-weight: bold;">Metal</span>.</p>', unsafe_allow_html=True)
-                elif st.session_state.test_param['Corr_Rsheet'] >= 5 and st.session_state.test_param['Corr_Rsheet'] <= 10**6:
+                elif tp['Corr_Rsheet'] >= 5 and tp['Corr_Rsheet'] <= 10**6:
                     # st.subheader("The sample surface is likely to be semiconductor.")
                     st.markdown('<p>The sample surface is likely to be <span style="font-size: larger; color: red; font-weight: bold;">Semiconductor</span>.</p>', unsafe_allow_html=True)
-                elif st.session_state.test_invalid != None or st.session_state.test_param['Corr_Rsheet'] >= 10**6:
+                elif st.session_state.test_invalid != None or tp['Corr_Rsheet'] >= 10**6:
                     # st.subheader("The sample surface is likely to be insulator.")
                     st.markdown('<p>The sample surface is likely to be <span style="font-size: larger; color: red; font-weight: bold;">Insulator</span>.</p>', unsafe_allow_html=True)
 
     with col2:
-        if  st.session_state.test_param["est_thickness"] != None:
-            st.metric("Thickness Correction Factor", f"{st.session_state.test_param['thicknessComp'].round(5)}")
+        if  tp["est_thickness"] != None:
+            st.metric("Thickness Correction Factor", f"{tp['thicknessComp'].round(5)}")
         else:
             st.metric("Thickness Correction Factor", "1")
-        st.metric("Lateral Correction Factor", f"{st.session_state.test_param['lateralComp'].round(5)}")
+        st.metric("Lateral Correction Factor", f"{tp['lateralComp'].round(5)}")
         # st.write(st.session_state.test_param['thicknessComp'])
         # st.write(st.session_state.test_param['lateralComp'])
     with col3:
         c1, c2 = st.columns(2)
         with c1:
             st.write("Calculated V/I (Ω) :")
-            st.write(st.session_state.test_param['Cal_V/I'])
+            st.write(tp['Cal_V/I'])
         with c2:
             if st.session_state.auto_result == True:
                 st.write("Filtered V/I (Ω) :")
-                st.write(st.session_state.test_param['Cal_V/I_filtered'])
+                st.write(tp['Cal_V/I_filtered'])
                 st.write("Average Filtered V/I (Ω) :")
-                st.write(st.session_state.test_param['Avg_V/I_filtered'])
+                st.write(tp['Avg_V/I_filtered'])
     # st.write(st.session_state.test_param['Corr_Rsheet'])
 
 ## display remote test
@@ -786,50 +764,11 @@ if 'Measured_df' in st.session_state and st.session_state.Measured_df is not Non
 # if st.session_state.Measured_df is not None:
     # if st.session_state.manual_mode_enable == True:
     if st.session_state.auto_result == False:
+        from streamlit_echarts import st_echarts # only needed once there is a chart to draw
         df = st.session_state.Measured_df
         # tab1, tab2 = st.tabs(["Chart", "Data"])
 
-        # original credict: https://echarts.apache.org/examples/en/editor.html?c=line-simple
-        options = {
-            "title": {"text": "Measured Data", "left": "center"},
-            "tooltip": {"trigger": "axis"},
-            "legend": {"data": ["Voltage", "Current"], "right": 10},
-            "grid": {"left": "3%", "right": "4%", "bottom": "3%", "containLabel": True},
-            # "toolbox": {"feature": {"saveAsImage": {"type:'png'": None}}},
-            "xAxis": {
-                "name": "Time",
-                "type": "category",
-                "boundaryGap": False,
-                "data": df["Time"].tolist(),
-            },
-            # "yAxis": {"type": "value"},
-            "yAxis": [
-                {
-                "name": 'Current (A)\n\nVoltage (V)',
-                "type": 'value'
-                },
-                # {
-                # "name": 'Voltage(V)',
-                # "nameLocation": 'start',
-                # "alignTicks": "true",
-                # "type": 'value',
-                # "inverse": "true"
-                # }
-            ],
-            "series": [
-                {
-                    "name": "Voltage",
-                    "type": "line",
-                    "data": df["Voltage"].tolist(),
-                },
-                {
-                    # "yAxisIndex": 1,
-                    "name": "Current",
-                    "type": "line",
-                    "data": df["Current"].tolist(),
-                },
-            ],
-        }
+        options = build_chart_options(df)
         st_echarts(options=options, height="400px") 
 
 
@@ -876,9 +815,10 @@ with save_container:
             # df = pd.DataFrame({"col1": [1, 2], "col2": [3, 4]})   # Test line
             df = st.session_state.Measured_df
 
-            df['Test Param'] = [st.session_state.test_param] + [None] * (len(df) - 1)
-
-            df.to_csv(full_file_path, index=False)
+            # test parameters go in a leading comment line, read the file back with pd.read_csv(path, comment='#')
+            with open(full_file_path, 'w', encoding='utf-8', newline='') as f:
+                f.write('# Test Param: ' + json.dumps(st.session_state.test_param, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o)) + '\n')
+                df.to_csv(f, index=False)
             st.success(f"File saved successfully at {full_file_path}")
         except Exception as e:
             st.error(f"Error saving file: {e}")
\ No newline at end of file
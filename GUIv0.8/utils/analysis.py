@@ -0,0 +1,159 @@
+from functools import lru_cache
+import numpy as np
+
+# Define the function to check if the Current is within ±30% of the Source
+def current_in_range_mask(source, current):
+    """
+    Checks element-wise if the current values are within 70% to 130% of the source values.
+
+    Parameters:
+    - source (array-like): The source values.
+    - current (array-like): The measured current values.
+
+    Returns:
+    - np.ndarray: Boolean mask, True where the current is within 70% to 130% of the source.
+    """
+    source = np.abs(source)
+    current = np.abs(current)
+    # reuse one scratch buffer for both bounds and combine the comparisons in place
+    bound = np.multiply(source, 0.7)
+    mask = np.greater_equal(current, bound)
+    np.multiply(source, 1.3, out=bound)
+    mask &= np.less_equal(current, bound)
+    return mask
+
+def remove_anomaly_iqr(measurements):
+    measurements = np.asarray(measurements)
+    # Calculate Q1 (25th percentile) and Q3 (75th percentile)
+    # Q1 = np.percentile(measurements, 25)
+    # Q3 = np.percentile(measurements, 75)
+    Q1 = np.percentile(measurements, 40)
+    Q3 = np.percentile(measurements, 60)
+    # Calculate IQR
+    IQR = Q3 - Q1
+    
+    # Define the bounds for non-anomalous data
+    lower_bound = Q1 - 0.85 * IQR
+    upper_bound = Q3 + 0.85 * IQR
+    
+    # Filter out anomalies
+    filtered_measurements = measurements[(measurements >= lower_bound) & (measurements <= upper_bound)]
+    
+    return filtered_measurements
+
+def remove_outliers_amd(data, threshold=1.6):
+    """
+    Remove outliers from the data using AMD (Absolute Median Deviation).
+
+    Parameters:
+    data (array-like): Input data.
+    threshold (float): Threshold for outlier detection, default is 1.6.
+
+    Returns:
+    array-like: Data with outliers removed.
+    """
+    data = np.asarray(data)
+    median = np.median(data)
+    deviations = np.subtract(data, median)
+    np.abs(deviations, out=deviations)
+    amd = np.median(deviations)
+    mask = deviations <= threshold * amd
+    return data[mask]
+
+def downsample_indices(y, target=2000):
+    """
+    Select the indices of the minimum and maximum of each bucket of y, so a plot of the
+    selected points keeps the visible envelope of the full trace.
+
+    Parameters:
+    - y (array-like): The trace to be downsampled.
+    - target (int): The approximate maximum number of points to keep, default is 2000.
+
+    Returns:
+    - np.ndarray: Sorted unique indices into y, all indices if len(y) <= target.
+    """
+    y = np.asarray(y)
+    n = len(y)
+    if n <= target:
+        return np.arange(n)
+    n_buckets = max(target // 2, 1)
+    bucket = n // n_buckets
+    usable = bucket * n_buckets
+    blocks = y[:usable].reshape(n_buckets, bucket)
+    offsets = np.arange(usable, step=bucket)
+    idx = [offsets + blocks.argmin(axis=1), offsets + blocks.argmax(axis=1)]
+    if usable < n: # the leftover samples form one last, shorter bucket
+        idx.append([usable + y[usable:].argmin(), usable + y[usable:].argmax()])
+    return np.unique(np.concatenate(idx))
+
+@lru_cache(maxsize=128)
+def thickness_correction(thickness, Probe_spacing):
+    """
+    Calculate thickness correction factor for a given thickness and probe spacing.
+    
+    Parameters:
+    - thickness (float): The thickness of the material.
+    - Probe_spacing (float): The distance between the probes.
+    
+    Returns:
+    - f_1 (float): The thickness correction factor.
+    """
+    t = thickness
+    s = Probe_spacing
+    ln_2 = np.log(2)
+    # sinh(t/s) / sinh(t/2s) == 2*cosh(x) == exp(x) + exp(-x) with x = t/2s, logaddexp takes its log without overflowing
+    x = t / (2 * s)
+    ln_ratio = np.logaddexp(x, -x)
+    f_1 = ln_2 / ln_ratio
+    return f_1
+
+@lru_cache(maxsize=128)
+def circle_lateral_correction(diameter, Probe_spacing):
+    """
+    Calculate lateral correction factor for circular geometries.
+    
+    Parameters:
+    - diameter (float): The diameter of the circular object.
+    - Probe_spacing (float): The distance between the probes.
+    
+    Returns:
+    - f_2 (float): The lateral correction factor for a circle.
+    """
+    d = diameter
+    s = Probe_spacing
+    ln_2 = np.log(2)
+    d_over_s_squared = (d / s) ** 2
+    numerator = d_over_s_squared + 3
+    denominator = d_over_s_squared - 3
+    ln_fraction = np.log(numerator / denominator)
+    f_2 = ln_2 / (ln_2 + ln_fraction)
+    return f_2
+
+@lru_cache(maxsize=128)
+def square_lateral_correction(d, a, s, num_terms=50):
+    """
+    Calculate lateral correction factor for square geometries.
+    
+    Parameters:
+    - d (float): The distance.
+    - a (float): The side length of the square.
+    - s (float): The probe spacing.
+    - num_terms (int, optional): The number of terms to use in the series expansion (default is 50).
+    
+    Returns:
+    - (float): The lateral correction factor for a square.
+    """
+    a = a/s
+    d = d/s
+    # evaluate all terms of the series at once, every exponential is a power of exp(-2*pi*m/d)
+    m = np.arange(1, num_terms+1, dtype=np.float64)
+    e = np.exp(-2 * np.pi * m / d)
+    term_a = e ** (a - 2)
+    term_b = 1 - e * e * e
+    term_c = 1 - e
+    term_d = 1 + e
+    sum_am = np.sum(term_a * (term_b * term_c) / term_d / m)
+    term1 = np.pi / d
+    term2 = np.log(1 - np.exp(-4 * np.pi / d))
+    term3 = -np.log(1 - np.exp(-2 * np.pi / d))
+    return np.log(2) / (term1 + term2 + term3 + sum_am)
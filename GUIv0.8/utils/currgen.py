@@ -1,16 +1,18 @@
-from numpy import zeros
+from numpy import zeros, empty, float64
 
 class WaveGen:
-    def __init__(self, magnitude=0, threshold=1):
+    def __init__(self, magnitude=0, threshold=1, dtype=float64):
         """
         Initialize the WaveGen class with a specified magnitude and threshold.
 
         Parameters:
         magnitude (int): The magnitude, which is 10 to the power of n, default value is 0.
         threshold (float): The threshold value for high/low values, default value is 1.
+        dtype (np.dtype): The dtype of the generated waves, default is float64 which Measure_List sends to the instrument.
         """
         self.magnitude = 10 ** magnitude
         self.threshold = threshold
+        self.dtype = dtype
 
     def _check_safety(self, value):
         """
@@ -29,7 +31,7 @@ class WaveGen:
             return True
 
 
-    def generate_pulse_wave(self, length, pulse_width, pulse_position, high_value=1):
+    def generate_pulse_wave(self, length, pulse_width, pulse_position, high_value=1, strict=False):
         """
         Generate a pulse wave numpy array.
 
@@ -38,6 +40,7 @@ class WaveGen:
         pulse_width (int): Width of the pulse (high value duration).
         pulse_position (int): Start position of the pulse.
         high_value (float): High value of the pulse. Default is 1, scaled by magnitude.
+        strict (bool): Raise ValueError instead of generating when high_value is unsafe. Default is False.
 
         Returns:
         np.ndarray: A numpy array containing the pulse wave.
@@ -45,21 +48,22 @@ class WaveGen:
         if pulse_position + pulse_width > length:
             raise ValueError("Pulse position and width exceed array length")
         
-        # Check safety for high_value
-        safe = self._check_safety(high_value)
+        # Check safety for high_value before allocating anything
+        if strict and not self._check_safety(high_value):
+            raise ValueError("High value exceeds safety threshold")
         
         # Apply magnitude to high_value
         high_value *= self.magnitude
         
         # Initialize array with zeros
-        pulse_wave = zeros(length)
+        pulse_wave = zeros(length, dtype=self.dtype)
         
         # Set the pulse high value
         pulse_wave[pulse_position:pulse_position + pulse_width] = high_value
         
         return pulse_wave
 
-    def generate_square_wave(self, length, high_value=1, low_value=-1, period=10, duty_cycle=0.5, init_time=0):
+    def generate_square_wave(self, length, high_value=1, low_value=-1, period=10, duty_cycle=0.5, init_time=0, strict=False):
         """
         Generate a square wave numpy array.
 
@@ -70,38 +74,39 @@ class WaveGen:
         period (int): Period of the square wave (total duration of high and low values).
         duty_cycle (float): Duty cycle of the square wave (high value duration as a fraction of the period, range 0 to 1).
         init_time (int): Initial time with value 0 at the beginning of the array.
+        strict (bool): Raise ValueError instead of generating when high_value or low_value is unsafe. Default is False.
 
         Returns:
         np.ndarray: A numpy array containing the square wave.
         """
-        # Check safety for high_value and low_value
-        hi_safe = self._check_safety(high_value)
-        lo_safe = self._check_safety(low_value)
+        # Check safety for high_value and low_value before allocating anything
+        if strict and not (self._check_safety(high_value) and self._check_safety(low_value)):
+            raise ValueError("High or low value exceeds safety threshold")
         
         # Apply magnitude to high_value and low_value
         high_value *= self.magnitude
         low_value *= self.magnitude
         
-        # Initialize array
-        square_wave = zeros(length)
+        # Initialize array, every sample after init_time is written below so only the leading part needs zeroing
+        square_wave = empty(length, dtype=self.dtype)
+        square_wave[:init_time] = 0.0
         
         # Calculate high duration
         high_duration = int(period * duty_cycle)
         
         # Generate the square wave starting after the init_time
-        i = init_time
-        while i < length:
-            if i + high_duration <= length:
-                square_wave[i:i + high_duration] = high_value
-            else:
-                square_wave[i:length] = high_value
-                break
-            i += high_duration
-            if i + (period - high_duration) <= length:
-                square_wave[i:i + (period - high_duration)] = low_value
-            else:
-                square_wave[i:length] = low_value
-                break
-            i += (period - high_duration)
+        n = length - init_time
+        if n <= 0:
+            return square_wave
+        if period <= 0:
+            raise ValueError("Period must be positive")
+        one_period = empty(period, dtype=self.dtype)
+        one_period[:high_duration] = high_value
+        one_period[high_duration:] = low_value
+        # write whole periods through a (periods, period) view of the array, then the partial tail
+        full_periods, tail = divmod(n, period)
+        body = square_wave[init_time:]
+        body[:full_periods * period].reshape(full_periods, period)[:] = one_period
+        body[full_periods * period:] = one_period[:tail]
         
         return square_wave
\ No newline at end of file
@@ -1,21 +1,55 @@
 from datetime import timedelta, datetime
-from time import sleep
-from numpy import reshape
-from numpy import array
+from time import monotonic
+import logging
+import numpy as np
 import keysight_ktb2900
 
+logger = logging.getLogger(__name__)
+
+# Supported models for the voltage measurement, wait time and trigger count properties used in Measure_List
+_MODELS_WITH_VOLT_SENSE = frozenset({"B2901A", "B2902A", "B2911A", "B2912A", "B2901B", "B2902B", "B2911B", "B2912B"})
+
+# VISA status code of an I/O timeout (VI_ERROR_TMO)
+_VI_ERROR_TMO = -1073807339
+
+def _is_io_timeout(e):
+    """
+    Check if the exception raised by the driver is an I/O timeout.
+    The driver does not expose a timeout exception class, so the class name, arguments and
+    VISA status code are inspected instead.
+    """
+    if "timeout" in e.__class__.__name__.lower():
+        return True
+    for arg in e.args:
+        if arg == _VI_ERROR_TMO:
+            return True
+        text = str(arg).lower()
+        if "timeout" in text or "timed out" in text or str(_VI_ERROR_TMO) in text:
+            return True
+    return False
+
+class DeviceError(Exception):
+    """
+    Raised when an operation on the Keysight B2900 instrument fails.
+    The message holds the original exception class name and arguments.
+    """
+
 class B2900_target_control:
     """
     This class is designed to interface with and control a Keysight B2900 series 
     source/measure unit (SMU). It handles initialization, setting up connections, 
     error checking, and provides access to device identity properties.
     """
+    _driver_cache = {} # resource_name -> [driver, reference count, applied trigger counts], open drivers shared by all instances
+
     def __init__(self,
                  resource_name=None,
                  idQuery=True,
                  reset=True,
                  options="QueryInstrStatus=True, Simulate=False, Trace=False",
-                 delta=timedelta(days=0, seconds=100, microseconds=0, milliseconds=0, minutes=0, hours=0, weeks=0)):
+                 delta=timedelta(days=0, seconds=100, microseconds=0, milliseconds=0, minutes=0, hours=0, weeks=0),
+                 error_max_iter=32,
+                 verbose=False):
         """
         Initializes the B2900_target_control object.
 
@@ -25,6 +59,8 @@ class B2900_target_control:
         - reset (bool): Whether to reset the instrument during initialization.
         - options (str): Driver options for initialization.
         - delta (timedelta): Timeout value for instrument I/O operations.
+        - error_max_iter (int): Maximum number of error queue reads each time the queue is drained.
+        - verbose (bool): Print progress of the measurement and calibration to stdout.
         """
 
         self.resource_name = resource_name
@@ -32,44 +68,65 @@ class B2900_target_control:
         self.reset = reset
         self.options = options
         self.delta = delta
+        self.error_max_iter = error_max_iter
+        self.verbose = verbose
         self.driver = None
         self.error = None # reffering to initialisation error only
+        self.use_batched_scpi = True # configure Measure_List with one SCPI message, falls back to the IVI properties if the driver rejects it
+        self._trigger_counts = {} # last trigger count applied per channel index, shared with every instance on the same driver
 
         try:
-            # Call driver constructor with options
-            self.driver = keysight_ktb2900.KtB2900(self.resource_name, self.idQuery, self.reset, self.options)
-            print("Driver Initialized")
-
-            # Print a few identity properties
-            print('  identifier: ', self.driver.identity.identifier)
-            print('  revision:   ', self.driver.identity.revision)
-            print('  vendor:     ', self.driver.identity.vendor)
-            print('  description:', self.driver.identity.description)
-            print('  model:      ', self.driver.identity.instrument_model)
-            print('  resource:   ', self.driver.driver_operation.io_resource_descriptor)
-            print('  options:    ', self.driver.driver_operation.driver_setup)
+            entry = B2900_target_control._driver_cache.get(self.resource_name)
+            if entry is not None:
+                # Reuse the open session, skipping the driver initialisation, identity query and reset
+                self.driver = entry[0]
+                entry[1] += 1
+                self._trigger_counts = entry[2]
+                print("Driver Reused")
+            else:
+                # Call driver constructor with options
+                self.driver = keysight_ktb2900.KtB2900(self.resource_name, self.idQuery, self.reset, self.options)
+                B2900_target_control._driver_cache[self.resource_name] = [self.driver, 1, self._trigger_counts]
+                print("Driver Initialized")
+
+                # Print a few identity properties
+                print('  identifier: ', self.driver.identity.identifier)
+                print('  revision:   ', self.driver.identity.revision)
+                print('  vendor:     ', self.driver.identity.vendor)
+                print('  description:', self.driver.identity.description)
+                print('  model:      ', self.driver.identity.instrument_model)
+                print('  resource:   ', self.driver.driver_operation.io_resource_descriptor)
+                print('  options:    ', self.driver.driver_operation.driver_setup)
 
             # Manually set the IO timeout
             self.driver.system.io_timeout = self.delta
 
-            self.chan_list = [name for name in self.driver.outputs]
+            # Channel names, model and number of outputs are remote reads, cache them once
+            self.refresh_cache()
 
             # Check instrument for errors
-            self.fetched_error = None
-            while True:
-                outVal = self.driver.utility.error_query()
-                self.fetched_error = outVal
-                if outVal[0] == 0:  # 0 = No error, error queue empty
-                    break
+            self.fetched_error = self._drain_errors()
 
         except Exception as e:
             print("\n  Exception:", e.__class__.__name__, e.args)
             self.error = (e.__class__.__name__, e.args)
+            if self.driver is not None: # do not leave a half initialised driver for the next instance to reuse
+                self.release()
         
         # finally:
         #     if self.driver is not None:  # Skip close() if constructor failed
         #         self.driver.close()
 
+    def refresh_cache(self):
+        """
+        Re-read the channel names, model number and number of outputs from the instrument.
+        These are cached at initialisation, call this if the driver is pointed at another instrument.
+        """
+        self.chan_list = [name for name in self.driver.outputs]
+        self._model = self.driver.identity.instrument_model
+        self._n_outputs = self.driver.outputs.count
+        self._trigger_counts.clear() # cleared in place, the dict is shared through _driver_cache
+
     def channel_model_query(self):
         """
         Query the channel model and fetch errors for the Keysight B2900 instrument.
@@ -80,37 +137,196 @@ class B2900_target_control:
         - fetched_error (tuple): The last fetched error code and message from the instrument.
 
         If an exception occurs, returns:
-        - (str, tuple): The exception class name and exception arguments.
+        - (None, None, (str, tuple)): The exception class name and arguments in place of fetched_error.
         """
         try:
             self.driver.system.io_timeout = self.delta
             # The number of repeated capability instances is returned by the count property
             # It returns 1 for this B2912A_Target, which means Channel 2 is not available here, however, it can be turned on by change the chanlist to "(@1,2)"
-            chan_list = []
-            for name in self.driver.outputs:
-                chan_list.append(name)
-            ModelNo = self.driver.identity.instrument_model
-            print("ModelNo. :" + ModelNo)
+            chan_list = list(self.chan_list)
+            ModelNo = self._model
+            if self.verbose:
+                print("ModelNo. :" + ModelNo)
             # Check instrument for errors
-            print()
-            while True:
-                outVal = ()
-                outVal = self.driver.utility.error_query()
-                print("  error_query: code:", outVal[0], " message:", outVal[1])
-                fetched_error = outVal
-                if(outVal[0] == 0): # 0 = No error, error queue empty
-                    break
+            fetched_error = self._drain_errors()
             return chan_list, ModelNo, fetched_error
         
         except Exception as e:
             print("\n  Exception:", e.__class__.__name__, e.args)
-            return e.__class__.__name__, e.args
+            return None, None, (e.__class__.__name__, e.args)
         
         # finally:
         #     if self.driver is not None: # Skip close() if constructor failed
         #         self.driver.close()
         
-    def Measure_List(self, selected_channel = '1', current_data = None, nplc = 1, curr_range = None, mea_volt_range = None, mea_wait = None, compliance_volt = 2):
+    def _drain_errors(self, max_iter=None):
+        """
+        Read the instrument error queue until it is empty, at most max_iter times.
+
+        Parameters:
+        - max_iter (int): Maximum number of error queue reads, defaults to self.error_max_iter.
+
+        Returns:
+        - fetched_error (tuple): The last error code and message read from the queue,
+          (0, "No error") if the queue was already empty.
+        """
+        if max_iter is None:
+            max_iter = self.error_max_iter
+        errs = []
+        for _ in range(max_iter):
+            outVal = self.driver.utility.error_query()
+            if outVal[0] == 0: # 0 = No error, error queue empty
+                break
+            errs.append(outVal)
+        else:
+            print(f"  error_query: queue not empty after {max_iter} reads")
+        if not errs:
+            return (0, "No error")
+        print(f"  error_query: {len(errs)} error(s), last code:", errs[-1][0], " message:", errs[-1][1])
+        return errs[-1]
+
+    @staticmethod
+    def _build_setup_scpi(channel, current_data, nplc, curr_range, mea_volt_range, mea_wait, compliance_volt, model):
+        """
+        Compose the SCPI commands that configure one channel for a list current measurement.
+
+        The commands mirror the IVI property assignments in _configure_ivi and are joined
+        with ";" so the whole setup goes to the instrument in a single message.
+
+        Parameters:
+        - channel (int): The channel number to be configured, starting at 1.
+        - model (str): The model number of the instrument, the voltage measurement settings are only sent to supported models.
+        - current_data (np.array): Contiguous float64 array of the list currents.
+        - The other parameters are the same as in Measure_List.
+
+        Returns:
+        - (str): The concatenated SCPI commands.
+        """
+        n = channel
+        cmds = [f":SOUR{n}:FUNC:MODE CURR",
+                f":SOUR{n}:CURR:MODE LIST",
+                f":SOUR{n}:LIST:CURR " + ",".join(map("{:.6e}".format, current_data.tolist()))]
+        if curr_range is not None:
+            cmds += [f":SOUR{n}:CURR:RANG:AUTO OFF", f":SOUR{n}:CURR:RANG {curr_range}"]
+        else:
+            cmds.append(f":SOUR{n}:CURR:RANG:AUTO ON")
+        cmds.append(f":SENS{n}:REM ON") # remote sensing (4-wire measurement)
+        if model in _MODELS_WITH_VOLT_SENSE:
+            if mea_volt_range is not None:
+                cmds += [f":SENS{n}:VOLT:RANG:AUTO OFF", f":SENS{n}:VOLT:RANG {mea_volt_range}"]
+            else:
+                cmds.append(f":SENS{n}:VOLT:RANG:AUTO ON")
+            cmds += [f":SENS{n}:VOLT:PROT {compliance_volt}",
+                     f":SENS{n}:VOLT:NPLC {nplc}",
+                     f":TRIG{n}:TRAN:COUN {len(current_data)}"]
+            if mea_wait is not None:
+                cmds += [f":SENS{n}:WAIT ON", f":SENS{n}:WAIT:OFFS {mea_wait}"]
+            else:
+                cmds.append(f":SENS{n}:WAIT OFF")
+            cmds += [f":TRIG{n}:ACQ:COUN {len(current_data)}",
+                     f":TRIG{n}:ACQ:TOUT ON"]
+        return ";".join(cmds)
+
+    def _configure_ivi(self, i, current_data, nplc, curr_range, mea_volt_range, mea_wait, compliance_volt, model):
+        """
+        Configure channel index i for a list current measurement through the IVI driver properties.
+        Each assignment is a separate message to the instrument, this is the fallback for drivers
+        that reject the concatenated commands of _build_setup_scpi.
+        """
+        # resolve the repeated capabilities of channel i once
+        out_i, meas_i, tr_i = self.driver.outputs[i], self.driver.measurements[i], self.driver.transients[i]
+        out_i.type = keysight_ktb2900.OutputType.CURRENT # specify output type as current
+        if curr_range is not None:
+            out_i.current.auto_range_enabled = False
+            out_i.current.range = curr_range
+        else:
+            out_i.current.auto_range_enabled = True
+
+        meas_i.remote_sensing_enabled = True # Enable remote sensing (4-wire measurement)
+        ##################
+        transient_current = tr_i.current
+        transient_current.mode = keysight_ktb2900.TransientCurrentVoltageMode.LIST
+        # Set the transient current list
+        # current_data = np.array([0.02, 0.02, 0.03, 0.04, 0.05], dtype='double') # Testing data for debugging
+        transient_current.configure_list(current_data)
+        if self.verbose: # the readback is an extra round trip for data that was just sent
+            l = transient_current.query_list()
+            print("List: ", l)
+        ####################
+        ####################
+        if model in _MODELS_WITH_VOLT_SENSE:
+            if mea_volt_range is not None:
+                meas_i.voltage.auto_range_enabled = False
+                meas_i.voltage.range = mea_volt_range
+            else:
+                meas_i.voltage.auto_range_enabled = True; #Supported Models for this property: B2901A|B, B2902A|B, B2911A|B, B2912A|B
+            meas_i.voltage.compliance_value = compliance_volt
+            meas_i.voltage.nplc = nplc
+            ###################
+            if mea_wait is not None:
+                meas_i.wait_time.enabled = True
+                meas_i.wait_time.offset = mea_wait
+            else:
+                meas_i.wait_time.enabled = False
+            # the trigger counts only change with the list length, skip the writes when they are already applied
+            if self._trigger_counts.get(i) != len(current_data):
+                tr_i.trigger.count = len(current_data)
+                meas_i.trigger.count = len(current_data)
+                self._trigger_counts[i] = len(current_data)
+            meas_i.trigger.trigger_output_enabled = True
+            ###################
+
+    def _disable_outputs(self):
+        """
+        Disable all outputs, with one SCPI message unless the batched commands were rejected before.
+        """
+        if self.use_batched_scpi:
+            try:
+                self.driver.system.write_string(";".join(f":OUTP{k+1} OFF" for k in range(self._n_outputs)))
+                return
+            except Exception as e:
+                print("\n  Batched output disable failed, using the IVI properties:", e.__class__.__name__, e.args)
+        for k in range(self._n_outputs):
+            self.driver.outputs[k].enabled = False
+
+    @staticmethod
+    def _fetch_type(fetch_fields):
+        """
+        Combine the requested fields into one MeasurementFetchType value.
+
+        Parameters:
+        - fetch_fields (sequence): keysight_ktb2900.MeasurementFetchType members, None for ALL.
+
+        Returns:
+        - fetch_type (keysight_ktb2900.MeasurementFetchType): The combined fetch type.
+        - n_fields (int): The number of fields, i.e. columns, the fetch returns.
+        """
+        FetchType = keysight_ktb2900.MeasurementFetchType
+        if fetch_fields is None:
+            return FetchType.ALL, 6 # ALL => Voltage, Current, Resistance, Time, Status, Source
+        if len(fetch_fields) == 0:
+            raise ValueError("fetch_fields is empty, pass None to fetch ALL")
+        bits = 0
+        for field in fetch_fields:
+            if field == FetchType.ALL:
+                raise ValueError("fetch_fields contains ALL, pass None to fetch ALL")
+            try:
+                field_bits = int(field)
+            except (TypeError, ValueError):
+                raise ValueError(f"fetch_fields entry {field!r} is not a MeasurementFetchType flag") from None
+            if field_bits <= 0 or field_bits & (field_bits - 1):
+                raise ValueError(f"fetch_fields entry {field!r} is not a single MeasurementFetchType flag")
+            if bits & field_bits:
+                raise ValueError(f"fetch_fields contains {field!r} more than once")
+            bits |= field_bits
+        try:
+            fetch_type = FetchType(bits)
+        except ValueError:
+            raise ValueError("MeasurementFetchType is not a flag enum, its fields cannot be combined") from None
+        # one column per bit set, the columns keep the instrument order
+        return fetch_type, bin(bits).count("1")
+
+    def Measure_List(self, selected_channel = '1', current_data = None, nplc = 1, curr_range = None, mea_volt_range = None, mea_wait = None, compliance_volt = 2, out = None, progress_cb = None, fetch_fields = None):
         """
         Configure and execute a list-based current measurement on a Keysight B2900 series instrument.
 
@@ -122,87 +338,91 @@ class B2900_target_control:
         - mea_volt_range (float): The range setting for voltage measurement (if not using auto-range).
         - mea_wait (float): The wait time offset for the measurement in seconds.
         - compliance_volt (float): The compliance voltage setting.
+        - out (np.array): Optional preallocated (len(current_data), number of fetched fields) array the result is written into.
+        - progress_cb (callable): Optional callback taking a str, called as the measurement progresses.
+        - fetch_fields (sequence): Optional keysight_ktb2900.MeasurementFetchType members to fetch, fetching only
+          the needed fields reduces the transferred data. The columns keep the instrument order
+          (Voltage, Current, Resistance, Time, Status, Source). Default None fetches ALL.
 
         Returns:
-        - reshaped_result (np.array): A reshaped array of measurement data.
+        - reshaped_result (np.array): A reshaped array of measurement data, `out` itself when it is given.
         - fetched_error (tuple): The last fetched error code and message from the instrument.
 
-        If an exception occurs, returns:
-        - str_e (str): A string representation of the exception class name and arguments.
+        Raises:
+        - ValueError: If fetch_fields contains ALL, a repeated field or values that cannot be combined.
+        - DeviceError: If an exception occurs, carrying the exception class name and arguments.
         """
+        # validated before talking to the instrument, so a bad argument is not reported as a device failure
+        fetch_type, n_fields = self._fetch_type(fetch_fields)
         try:
-            iNumberOfChannels = self.driver.outputs.count
+            # one contiguous float64 array for both the SCPI string and the IVI list, whatever the caller passed
+            current_data = np.ascontiguousarray(current_data, dtype=np.float64)
+            iNumberOfChannels = self._n_outputs
             # The number of repeated capability instances is returned by the count property
             # It returns 1 for this B2912A_Target, which means Channel 2 is not available here, however, it can be turned on by change the chanlist to "(@1,2)"
 
-            ModelNo = self.driver.identity.instrument_model
-            for i in range(iNumberOfChannels):
-                print("Channel " + str(i+1) + " enabled")
-                self.driver.outputs[i].type = keysight_ktb2900.OutputType.CURRENT # specify output type as current
-                if curr_range is not None:
-                    self.driver.outputs[i].current.auto_range_enabled = False
-                    self.driver.outputs[i].current.range = curr_range
-                else:
-                    self.driver.outputs[i].current.auto_range_enabled = True
-
-                self.driver.measurements[i].remote_sensing_enabled = True # Enable remote sensing (4-wire measurement)
-                ##################
-                transient_current = self.driver.transients[i].current
-                transient_current.mode = keysight_ktb2900.TransientCurrentVoltageMode.LIST
-                # Set the transient current list
-                # current_data = np.array([0.02, 0.02, 0.03, 0.04, 0.05], dtype='double') # Testing data for debugging
-                transient_current.configure_list(current_data)
-                l = transient_current.query_list()
-                print("List: ", l)
-                ####################
-                ####################
-                if (ModelNo == "B2901A" or ModelNo == "B2902A" or ModelNo == "B2911A" or ModelNo == "B2912A" or ModelNo == "B2901B" or ModelNo == "B2902B" or ModelNo == "B2911B" or ModelNo == "B2912B"):
-                    if mea_volt_range is not None:
-                        self.driver.measurements[i].voltage.auto_range_enabled = False
-                        self.driver.measurements[i].voltage.range = mea_volt_range
-                    else:
-                        self.driver.measurements[i].voltage.auto_range_enabled = True; #Supported Models for this property: B2901A|B, B2902A|B, B2911A|B, B2912A|B
-                    self.driver.measurements[i].voltage.compliance_value = compliance_volt
-                    self.driver.measurements[i].voltage.nplc = nplc
-                    ###################
-                    self.driver.transients[i].trigger.count = len(current_data)
-                    if mea_wait is not None:
-                        self.driver.measurements[i].wait_time.enabled = True
-                        self.driver.measurements[i].wait_time.offset = mea_wait
-                    else:
-                        self.driver.measurements[i].wait_time.enabled = False
-                    self.driver.measurements[i].trigger.count = len(current_data)
-                    self.driver.measurements[i].trigger.trigger_output_enabled = True
-                    ###################
-                chanlist = "(@"+str(selected_channel)+")"
-                print("Channel List: " + chanlist)
-                self.driver.trigger.initiate(chanlist)
-                dResult = self.driver.measurements.fetch_array_data((keysight_ktb2900.MeasurementFetchType.ALL), chan_list=chanlist) # ALL => Voltage, Current, Resistance, Time, Status, Source
-                # dResult = driver.measurements.fetch_array_data((keysight_ktb2900.MeasurementFetchType.CURRENT), chan_list="(@1,2)")
-                ##return data needed
-                print(f"Number of Fetched Elements: {len(dResult)}")
-                print("Measured data:")
-                for j in range(len(dResult)):
-                    print(f"Item[{j}]: {dResult[j]}")
-                for k in range(iNumberOfChannels):
-                    self.driver.outputs[k].enabled = False
-            # Check instrument for errors
-            while True:
-                outVal = ()
-                outVal = self.driver.utility.error_query()
-                print("  error_query: code:", outVal[0], " message:", outVal[1])
-                fetched_error = outVal
-                if(outVal[0] == 0): # 0 = No error, error queue empty
-                    break
-
-            num_sequences = len(dResult) // 6 
-            reshaped_result = reshape(dResult, (num_sequences, 6))   # data col in order: Voltage, Current, Resistance, Time, Status, Source
+            ModelNo = self._model
+            earlier_error = (0, "No error") # error already queued before a batched setup, reported in fetched_error
+            try:
+                for i in range(iNumberOfChannels):
+                    if self.verbose:
+                        print("Channel " + str(i+1) + " enabled")
+                    configured = False
+                    if self.use_batched_scpi:
+                        try:
+                            # empty the queue first so only errors caused by the batched setup are judged below
+                            queued_error = self._drain_errors()
+                            if queued_error[0] != 0 and earlier_error[0] == 0:
+                                earlier_error = queued_error
+                            self.driver.system.write_string(self._build_setup_scpi(i+1, current_data, nplc, curr_range, mea_volt_range, mea_wait, compliance_volt, ModelNo))
+                            # a rejected command only lands in the error queue, check it before triggering on a partial setup
+                            setup_error = self._drain_errors()
+                            if setup_error[0] == 0:
+                                configured = True
+                                if ModelNo in _MODELS_WITH_VOLT_SENSE:
+                                    self._trigger_counts[i] = len(current_data)
+                            else:
+                                print("\n  Batched setup rejected, using the IVI properties:", setup_error[0], setup_error[1])
+                                self.use_batched_scpi = False
+                                self._trigger_counts.pop(i, None) # the partial setup may have left any count behind
+                        except Exception as e:
+                            print("\n  Batched setup failed, using the IVI properties:", e.__class__.__name__, e.args)
+                            self.use_batched_scpi = False
+                            self._trigger_counts.pop(i, None)
+                    if not configured:
+                        self._configure_ivi(i, current_data, nplc, curr_range, mea_volt_range, mea_wait, compliance_volt, ModelNo)
+                    chanlist = "(@"+str(selected_channel)+")"
+                    if self.verbose:
+                        print("Channel List: " + chanlist)
+                    self.driver.trigger.initiate(chanlist)
+                    if progress_cb is not None:
+                        progress_cb(f"Measurement started on channel {selected_channel}.")
+                    dResult = self.driver.measurements.fetch_array_data(fetch_type, chan_list=chanlist)
+                    # dResult = driver.measurements.fetch_array_data((keysight_ktb2900.MeasurementFetchType.CURRENT), chan_list="(@1,2)")
+                    ##return data needed
+                    if self.verbose:
+                        print(f"Number of Fetched Elements: {len(dResult)}")
+                    if progress_cb is not None:
+                        progress_cb(f"Fetched {len(dResult)} elements.")
+                    logger.debug("Measured data len=%d first=%s", len(dResult), dResult[:6])
+            finally:
+                # disable the outputs once after the measurement, also when it failed
+                self._disable_outputs()
+            # convert with an explicit dtype once, then view it as one row per sample
+            reshaped_result = np.asarray(dResult, dtype=np.float64).reshape(-1, n_fields)   # data col in order (of the fetched fields): Voltage, Current, Resistance, Time, Status, Source
+            if out is not None:
+                np.copyto(out, reshaped_result)
+                reshaped_result = out
+            # Check instrument for errors, a single query when the queue is empty
+            fetched_error = self._drain_errors()
+            if fetched_error[0] == 0:
+                fetched_error = earlier_error
             return reshaped_result, fetched_error
         
         except Exception as e:
             print("\n  Exception:", e.__class__.__name__, e.args)
             str_e = str(e.__class__.__name__) + " " + str(e.args)
-            return str_e
+            raise DeviceError(str_e) from e
     
     def close(self):
         """
@@ -212,43 +432,85 @@ class B2900_target_control:
         releasing any resources or locks associated with the connection.
         """
         if self.driver is not None:
+            # drop it from the shared drivers so no later instance reuses the closed session
+            entry = B2900_target_control._driver_cache.get(self.resource_name)
+            if entry is not None and entry[0] is self.driver:
+                del B2900_target_control._driver_cache[self.resource_name]
             self.driver.close()
+            self.driver = None
 
-    def calibrate(self):
+    def release(self):
+        """
+        Release this instance's reference to the shared driver.
+
+        The driver is only closed once no other instance for the same resource uses it,
+        use close() to close it regardless.
+        """
+        if self.driver is None:
+            return
+        entry = B2900_target_control._driver_cache.get(self.resource_name)
+        if entry is None or entry[0] is not self.driver:
+            # another instance already closed this driver, only drop the reference
+            self.driver = None
+            return
+        entry[1] -= 1
+        if entry[1] == 0:
+            del B2900_target_control._driver_cache[self.resource_name]
+            self.driver.close()
+        self.driver = None
+
+    def calibrate(self, progress_cb=None, cal_timeout_s=30, poll_s=0.5):
         """
         Perform a calibration procedure on the Keysight B2900 instrument.
 
         This method sends a calibration command to the instrument, waits for the process 
         to complete, checks the calibration status, and handles any errors that may occur.
 
+        Parameters:
+        - progress_cb (callable): Optional callback taking a str, called as the calibration progresses.
+        - cal_timeout_s (float): Maximum time in seconds to wait for the calibration result.
+        - poll_s (float): IO timeout in seconds of each attempt to read the calibration result.
+
         Returns:
         - CALsuccess (bool): True if calibration was successful, False otherwise.
         - fetched_error (tuple): The last fetched error code and message from the instrument.
 
-        If an exception occurs, it prints the exception details.
+        If an exception occurs, returns:
+        - (None, (str, tuple)): The exception class name and arguments in place of fetched_error.
         """
         try:
             self.driver.system.write_string("*CAL?")
-            sleep(5)
-            CALstatus = self.driver.system.read_string()
-            print("Calibration status:", CALstatus)
+            if progress_cb is not None:
+                progress_cb("Calibration started.")
+            # read the result as soon as it is ready instead of waiting a fixed time, each read times out after poll_s
+            deadline = monotonic() + cal_timeout_s
+            self.driver.system.io_timeout = timedelta(seconds=poll_s)
+            try:
+                while True:
+                    try:
+                        CALstatus = self.driver.system.read_string()
+                        break
+                    except Exception as e:
+                        # only a read timeout means the calibration is still running, anything else is a real fault
+                        if not _is_io_timeout(e) or monotonic() >= deadline:
+                            raise
+            finally:
+                self.driver.system.io_timeout = self.delta
+            self._trigger_counts.clear() # the calibration can change the instrument settings
+            if self.verbose:
+                print("Calibration status:", CALstatus)
             if CALstatus == "+0":
-                print("Calibration successful")
+                if self.verbose:
+                    print("Calibration successful")
                 CALsuccess = True
             else:
-                print("Calibration failed")
+                if self.verbose:
+                    print("Calibration failed")
                 CALsuccess = False
-
-            print()
-            while True:
-                outVal = ()
-                outVal = self.driver.utility.error_query()
-                print("  error_query: code:", outVal[0], " message:", outVal[1])
-                fetched_error = outVal
-                if(outVal[0] == 0): # 0 = No error, error queue empty
-                    break
+            fetched_error = self._drain_errors()
 
             return CALsuccess, fetched_error
         
         except Exception as e:
-            print("\n  Exception:", e.__class__.__name__, e.args)
\ No newline at end of file
+            print("\n  Exception:", e.__class__.__name__, e.args)
+            return None, (e.__class__.__name__, e.args)